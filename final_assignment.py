@@ -1,58 +1,279 @@
 # -*- coding: utf-8 -*-
 import re
-import psycopg2
-from psycopg2 import extras
-from exceptions import Exception, AssertionError
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
-def cursor_connect(db_name, user_name, password, cursor_factory=None):
+from psycopg2 import extras, sql
+from uuid import uuid4
+from psycopg2.pool import ThreadedConnectionPool
+
+# Compiled once so hot endpoints skip the re module's per-call pattern
+# cache lookup when stripping user input.
+_NON_WORD = re.compile(r'\W+')
+
+# Whitelists for user-supplied identifiers and values. frozensets give
+# O(1) membership checks and are built once instead of per call.
+_DISEASES = frozenset(('heart_fail','alz_rel_sen','depression','cancer'))
+_STATES = frozenset(('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL',
+    'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE',
+    'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT',
+    'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr'))
+_RACES = frozenset(('white','black','hispanic','others'))
+_STATUSES = frozenset(('alive','dead'))
+_STATS = frozenset(('mean','median','sd'))
+_SEXES = frozenset(('male','female'))
+
+# Maps each whitelisted statistic to (response key, combined-query column)
+# pairs; stat_select_for_sex computes every statistic in one scan and
+# projects the requested one here.
+_STAT_FIELDS = {
+    'mean': (('age', 'mean_age'),
+             ('mean_carrier_reimb', 'mean_carrier_reimb'),
+             ('mean_bene_resp', 'mean_bene_resp'),
+             ('mean_homo_mo devations', 'mean_hmo_mo')),
+    'median': (('age', 'median_age'),
+               ('median_carrier_reimb', 'median_carrier_reimb'),
+               ('median_bene_resp', 'median_bene_resp'),
+               ('median_homo_mo devations', 'median_hmo_mo')),
+    'sd': (('age', 'sd_age'),
+           ('carrier_reimb_sd', 'sd_carrier_reimb'),
+           ('bene_resp_sd', 'sd_bene_resp'),
+           ('homo_mo_sd', 'sd_hmo_mo')),
+}
+
+# Connections are pooled at module level so each API call reuses an open
+# connection instead of paying a fresh TCP + auth handshake to Postgres.
+_POOL = None
+_POOL_KEY = None
+
+def _get_pool(db_name, user_name, password):
     """
-    Connects to the DB and returns the connection and cursor, ready to use.
+    Returns the module-level connection pool, creating it on first use.
+
+    The pool is keyed on (db_name, user_name, password) so a call with
+    different credentials replaces it rather than silently reusing the
+    wrong DB or a pool built with a stale password.
 
     Parameters
     ----------
-    db_dsn : str, unicode
-        DSN of the database to connect to.
+    db_name : str
+        name of database being accessed
+    user_name : str
+        username used to access the specfied database
+    password : str
+        password corresponding to user_name
+
+    Returns
+    -------
+    psycopg2.pool.ThreadedConnectionPool
+        The shared connection pool.
+    """
+    global _POOL, _POOL_KEY
+    key = (db_name, user_name, password)
+    if _POOL is None or _POOL_KEY != key:
+        if _POOL is not None:
+            # closeall() also kills connections other threads still have
+            # checked out; switching credentials mid-flight is assumed to
+            # only happen at startup or in single-threaded use.
+            _POOL.closeall()
+        _POOL = ThreadedConnectionPool(minconn=4, maxconn=32, dbname=db_name,
+                                       user=user_name, host='localhost',
+                                       port=5432, password=password)
+        _POOL_KEY = key
+    return _POOL
+
+# Composed query templates are memoized on (template, identifiers); the
+# identifier arguments are whitelist-validated and low-cardinality, so
+# the cache stays tiny and repeated requests skip re-composing the SQL.
+_SQL_CACHE = {}
+
+def _sql(template, *identifiers):
+    """
+    Builds a sql.SQL query from template with the given identifiers
+    spliced in via sql.Identifier, caching the composed result.
+
+    Parameters
+    ----------
+    template : str, unicode
+        query template with {0}, {1}, ... identifier placeholders
+    identifiers : str
+        table/column names to splice into the template
+
+    Returns
+    -------
+    psycopg2.sql.Composed
+        The composed query, ready for cursor.execute.
+    """
+    key = (template,) + identifiers
+    query = _SQL_CACHE.get(key)
+    if query is None:
+        query = sql.SQL(template).format(*[sql.Identifier(i) for i in identifiers])
+        _SQL_CACHE[key] = query
+    return query
+
+
+# Statements PREPAREd on each pooled connection, tracked per connection
+# so the parse/plan work is paid once per connection lifetime instead of
+# once per request.
+_PREPARED_STATEMENTS = weakref.WeakKeyDictionary()
+
+_CARRIER_AVGS_STATEMENT = """SELECT state, ROUND(AVG(carrier_reimb)::numeric,2)::float AS avg_carrier_reimb,
+        ROUND(AVG(bene_resp)::numeric,2)::float AS avg_bene_resp,
+        ROUND(AVG(hmo_mo)::numeric,2)::float AS avg_hmo_mo
+        FROM mv_cms
+        WHERE state = $1
+        GROUP BY state"""
+
+_STATS_BY_SEX_STATEMENT = """SELECT sex,
+        FLOOR(avg(age)) AS mean_age,
+        ROUND(avg(carrier_reimb)::numeric,2)::float AS mean_carrier_reimb,
+        ROUND(avg(bene_resp)::numeric,2)::float AS mean_bene_resp,
+        ROUND(avg(hmo_mo)::numeric,2)::float AS mean_hmo_mo,
+        FLOOR(percentile_cont(0.5) WITHIN GROUP (ORDER BY age))::float AS median_age,
+        ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY carrier_reimb))::numeric,2)::float AS median_carrier_reimb,
+        ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY bene_resp))::numeric,2)::float AS median_bene_resp,
+        ROUND((percentile_cont(0.5) WITHIN GROUP (ORDER BY hmo_mo))::numeric,2)::float AS median_hmo_mo,
+        ROUND(stddev_pop(age)::numeric,2)::float AS sd_age,
+        ROUND(stddev_pop(carrier_reimb)::numeric,2)::float AS sd_carrier_reimb,
+        ROUND(stddev_pop(bene_resp)::numeric,2)::float AS sd_bene_resp,
+        ROUND(stddev_pop(hmo_mo)::numeric,2)::float AS sd_hmo_mo
+        FROM (SELECT sex, age, carrier_reimb, bene_resp, hmo_mo
+        FROM mv_cms WHERE dod IS NOT NULL AND sex = $1) AS dead
+        GROUP BY sex"""
+
+def _prepare_once(conn, cursor, name, statement):
+    """
+    Issues PREPARE name AS statement once per pooled connection.
+
+    Parameters
+    ----------
+    conn : psycopg2.extensions.connection
+        connection returned by cursor_connect
+    cursor : psycopg2.extensions.cursor
+        cursor on conn used to run the PREPARE
+    name : str
+        server-side statement name; must be a module-defined constant
+    statement : str
+        the SQL text to prepare, with $1, $2, ... parameters
+    """
+    prepared = _PREPARED_STATEMENTS.get(conn)
+    if prepared is None:
+        prepared = set()
+        _PREPARED_STATEMENTS[conn] = prepared
+    if name not in prepared:
+        cursor.execute('PREPARE {0} AS {1};'.format(name, statement))
+        prepared.add(name)
+
+
+def cursor_connect(db_name, user_name, password, cursor_factory=extras.RealDictCursor):
+    """
+    Checks a connection out of the pool and returns the connection and
+    cursor, ready to use.
+
+    Parameters
+    ----------
+    db_name : str, unicode
+        name of the database to connect to.
     cursor_factory : psycopg2.extras
-        An optional psycopg2 cursor type, e.g. DictCursor.
+        An optional psycopg2 cursor type; defaults to RealDictCursor so
+        rows come back as dicts built in C rather than tuples.
 
     Returns
     -------
     (psycopg2.extensions.connection, psycopg2.extensions.cursor)
         A tuple of (psycopg2 connection, psycopg2 cursor).
     """
-    dbname= db_name
-    user = user_name
-    password= password
-    conn = psycopg2.connect(dbname=dbname, user=user, host='localhost', port=5432, password=password)
-    cur = conn.cursor()
-    
+    pool = _get_pool(db_name, user_name, password)
+    conn = pool.getconn()
+    # Read-only autocommit sessions: psycopg2 otherwise wraps every query
+    # in an implicit BEGIN and leaves the transaction open, costing an
+    # extra COMMIT/ROLLBACK round-trip per request on checkin.
+    if not conn.autocommit:
+        conn.set_session(readonly=True, autocommit=True)
     if not cursor_factory:
         cur = conn.cursor()
     else:
         cur = conn.cursor(cursor_factory=cursor_factory)
     return conn, cur
-    
 
-def execute_query(cursor,query):
+
+def release_connection(conn):
+    """
+    Returns a connection to the pool so later requests can reuse it.
+
+    Parameters
+    ----------
+    conn : psycopg2.extensions.connection
+        connection returned by cursor_connect
+    """
+    if _POOL is not None:
+        _POOL.putconn(conn)
+
+
+def execute_query(cursor, query, params=None):
     """
     Executes SQL query in Postgres SQL database that has been connected to
-    
+
     Parameters
     ----------
     cursor : str, unicode
         cursor returned by cursor connect
     query : str, unicode
         query to pass to Postgres SQL
-    
+    params : dict, tuple
+        optional parameters bound to the query's placeholders, letting
+        Postgres reuse the cached plan for repeated calls
+
     Returns
     -------
     result: SQL query
         results of query passed to the Postgres SQL connection
     """
-    cursor.execute(query)
+    cursor.execute(query, params)
     result = cursor.fetchall()
     return result
+
+
+def execute_query_iter(conn, query, params=None, itersize=1000):
+    """
+    Executes SQL query on a server-side (named) cursor and yields rows.
+
+    Unlike execute_query, the full result set is never materialized in
+    libpq on the client; rows stream from Postgres in batches of
+    itersize, keeping memory bounded for large result sets.
+
+    Parameters
+    ----------
+    conn : psycopg2.extensions.connection
+        connection returned by cursor_connect
+    query : str, unicode
+        query to pass to Postgres SQL
+    params : dict, tuple
+        optional parameters bound to the query's placeholders
+    itersize : int
+        number of rows fetched from the server per round-trip
+
+    Returns
+    -------
+    generator
+        Yields one row dict at a time.
+    """
+    cur = conn.cursor(name='stream_' + uuid4().hex,
+                      cursor_factory=extras.RealDictCursor, withhold=True)
+    cur.itersize = itersize
+    try:
+        cur.execute(query, params)
+        while True:
+            rows = cur.fetchmany(itersize)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        cur.close()
     
+@lru_cache(maxsize=512)
 def disease_count_by_race(col, db_name='hs611db', user_name='ATW', password='', table_name='cmspop', category = 'race'):   
     """
     Counts the number of cases of a specified disease for each race
@@ -84,43 +305,35 @@ def disease_count_by_race(col, db_name='hs611db', user_name='ATW', password='',
     /api/v1/freq/depression
     /api/v1/freq/cancer
     """    
-    diseases = ('heart_fail','alz_rel_sen','depression','cancer')
-    
     # Strip the user input to alpha characters only
-    if table_name == 'cmspop':
-        cleaned_disease = re.sub('\W+', '', col)
-        try:
-            if col not in diseases:
-                raise AssertionError("Disease '{0}' is not allowed".format(cleaned_disease))
-       
-            con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-            query = """SELECT race, COUNT({1})::integer from {0}
-                    WHERE {1} = 't'
-                    GROUP BY {2};""".format(table_name,cleaned_disease,category)
-            result = execute_query(cur, query)
-    
-            disease_counts = {col+'_count':[]}
-            for row in result:
-                count = {'race':row[0], 'count':row[1]}
-                disease_counts[col+'_count'].append(count)
-        except Exception as e:
-            raise Exception("Error: {}".format(e.message))
-        return disease_counts 
-    else:
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT race, COUNT({1})::integer from {0}
-                    WHERE {1} = 't'
-                    GROUP BY {2};""".format(table_name,col,category)
-        
-        result = execute_query(cur, query)
-        
-        counts = {'count':[]}
-        for row in result:
-            count = {category:row[0], 'count':row[1]}
-            counts['count'].append(count)
-        return counts       
+    cleaned_disease = _NON_WORD.sub('', col)
+    if cleaned_disease not in _DISEASES:
+        raise AssertionError("Disease '{0}' is not allowed".format(cleaned_disease))
+    if table_name != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name))
+    if category != 'race':
+        raise AssertionError("Category '{0}' is not allowed please use race".format(category))
+    count_key = cleaned_disease + '_count'
+    con = None
+    try:
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""SELECT json_build_object(%(key)s, COALESCE(json_agg(
+                json_build_object('race', race, 'count', cnt)), '[]'::json)) AS result
+                FROM (SELECT race, COUNT({1})::integer AS cnt from {0}
+                WHERE {1} = 't'
+                GROUP BY {2}) AS counts;""", table_name, cleaned_disease, category)
+        result = execute_query(cur, query, {'key':count_key})
+
+        disease_counts = result[0]['result']
+    except Exception as e:
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
+    return disease_counts
 
 
+@lru_cache(maxsize=512)
 def disease_max_carrier_bene_ratio_by_state_sex(disease, state, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Calcualtes the maximum ratio of carrier_reimb/bene_resp and returns the id(s) 
@@ -154,62 +367,51 @@ def disease_max_carrier_bene_ratio_by_state_sex(disease, state, db_name='hs611db
     /api/v1/max_carrier_bene/depression/WA
     /api/v1/max_carrier_bene/diabetes/CA
     """        
-    diseases = ('heart_fail','alz_rel_sen','depression','cancer')
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
     
     # Strip the user input to alpha characters only
-    cleaned_disease = re.sub('\W+', '', disease)
+    cleaned_disease = _NON_WORD.sub('', disease)
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
-        cleaned_state = "'"+cleaned_state.upper()+"'"
-    
+        cleaned_state = _NON_WORD.sub('', state)
+        cleaned_state = cleaned_state.upper()
+
     # Strip the user input to alpha characters only
+    if disease not in _DISEASES:
+        raise AssertionError("Disease '{0}' is not allowed".format(cleaned_disease))
+    if state not in _STATES:
+         raise AssertionError("State '{0}' is not allowed".format(cleaned_state))
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
+    con = None
     try:
-        if disease not in diseases:
-            raise AssertionError("Disease '{0}' is not allowed".format(cleaned_disease))
-        if state not in states:
-             raise AssertionError("State '{0}' is not allowed".format(cleaned_state))
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT id, sex, state, MAX(carrier_bene_ratio)::float AS carrier_bene_ratio FROM 
-                (SELECT LHS.*, carrier_reimb::float/bene_resp::float AS carrier_bene_ratio FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id 
-                WHERE bene_resp > 0 AND {2} = 't' AND state = {3}) as sq1 
-		 WHERE carrier_bene_ratio = (SELECT MAX(carrier_bene_ratio)::float AS carrier_bene_ratio FROM 
-                (SELECT LHS.*, carrier_reimb::float/bene_resp::float AS carrier_bene_ratio FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id 
-                WHERE bene_resp > 0 AND {2} = 't' AND state = {3}) AS sq2)
-		 GROUP BY id, sex, state
-		 ORDER BY carrier_bene_ratio DESC;""".format(table_name1,table_name2,cleaned_disease,cleaned_state)
-        
-        result = execute_query(cur, query)
-        
-        ratios = {'Max_Carrier_Resp/Bene_Resp':[]}
-        for row in result:
-            ratio = {'id':row[0],'sex':row[1],'state':row[2],'carrier_reimb/bene_resp ratio':row[3]}
-            ratios['Max_Carrier_Resp/Bene_Resp'].append(ratio)
-            
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""WITH ratios AS
+                (SELECT id, sex, state, carrier_bene_ratio
+                FROM mv_cms
+                WHERE carrier_bene_ratio IS NOT NULL AND {0} = 't' AND state = %(state)s)
+                SELECT id, sex, state, carrier_bene_ratio AS "carrier_reimb/bene_resp ratio" FROM
+                (SELECT id, sex, state, carrier_bene_ratio,
+                RANK() OVER (ORDER BY carrier_bene_ratio DESC) AS ratio_rank FROM ratios) AS ranked
+                WHERE ratio_rank = 1
+                ORDER BY carrier_bene_ratio DESC;""", cleaned_disease)
+
+        result = execute_query(cur, query, {'state':cleaned_state})
+
+        ratios = {'Max_Carrier_Resp/Bene_Resp': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
         
     return ratios
 
 
                         
+@lru_cache(maxsize=512)
 def carrier_reimb_avgs_select_state(state, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Calculate the state average of carrier reimbursement, hmo months, and beneificiary 
@@ -242,46 +444,33 @@ def carrier_reimb_avgs_select_state(state, db_name='hs611db', user_name='ATW', p
     /api/v1/carrier_reimb_avg/AL
     """
     
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
     # Strip the user input to alpha characters only
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
+        cleaned_state = _NON_WORD.sub('', state)
         cleaned_state = cleaned_state.upper()
+    if cleaned_state not in _STATES:
+        raise AssertionError("State '{0}' is not allowed".format(cleaned_state))
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
+    con = None
     try:
-        if cleaned_state not in states:
-            raise AssertionError("State '{0}' is not allowed".format(cleaned_state))
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT LHS.state,ROUND(AVG(RHS.carrier_reimb)::numeric,2)::float AS avg_carrier_reimb, 
-                ROUND(AVG(RHS.bene_resp)::numeric,2)::float AS avg_bene_resp, 
-                ROUND(AVG(RHS.hmo_mo)::numeric,2)::float AS avg_hmo_mo
-                FROM                             
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN                           
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id = RHS.id
-                WHERE state = {2}
-                GROUP BY LHS.state;""".format(table_name1,table_name2,"'"+cleaned_state+"'")
+        con, cur = cursor_connect(db_name, user_name, password)
+        _prepare_once(con, cur, 'carrier_avgs_by_state', _CARRIER_AVGS_STATEMENT)
+        result = execute_query(cur, 'EXECUTE carrier_avgs_by_state(%s);', (cleaned_state,))
         
-        result = execute_query(cur, query)
-        
-        claims_avgs = {'State_Averages':[]}
-        
-        for row in result:
-            freq = {'state':row[0], 'avg_carrier_reimb':row[1], 'avg_bene_resp':row[2], 'avg_hmo_mo':row[2]}
-            claims_avgs['State_Averages'].append(freq)
+        claims_avgs = {'State_Averages': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return claims_avgs
     
+@lru_cache(maxsize=512)
 def avg_death_age_for_concurrent_disease_by_sex(disease1, disease2, db_name='hs611db', user_name='ATW', password='', table_name='cmspop'):
     """
     Calculates the average age of death (by sex) for those who had at least
@@ -315,33 +504,34 @@ def avg_death_age_for_concurrent_disease_by_sex(disease1, disease2, db_name='hs6
     /api/v1/avg_age_of_death/cancer/alz_rel_sen
     """
     
-    diseases = ('heart_fail','alz_rel_sen','depression','cancer')
     # Strip the user input to alpha characters only
-    cleaned_disease1 = re.sub('\W+', '', disease1)
-    cleaned_disease2 = re.sub('\W+', '', disease1)
+    cleaned_disease1 = _NON_WORD.sub('', disease1)
+    cleaned_disease2 = _NON_WORD.sub('', disease2)
+    if cleaned_disease1 not in _DISEASES:
+        raise AssertionError("Disease {0} is not allowed".format(cleaned_disease1))
+    if cleaned_disease2 not in _DISEASES:
+        raise AssertionError("Disease {0} is not allowed".format(cleaned_disease2))
+    if table_name != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name))
+    
+    con = None
     try:
-        if cleaned_disease1 not in diseases:
-            raise AssertionError("Disease {0} is not allowed".format(cleaned_disease1))
-        if cleaned_disease2 not in diseases:
-            raise AssertionError("Disease {0} is not allowed".format(cleaned_disease2))
-        if table_name != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name))
-        
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT sex, FLOOR(avg(age)::integer) AS avg_age_of_death 
-                FROM (SELECT sex, FLOOR((dod-dob)/365) AS age from {0} WHERE dod IS NOT NULL AND {1} ='t' AND {2} ='t') as sq1 
-                GROUP BY sex;""".format(table_name,cleaned_disease1, cleaned_disease2)
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""SELECT sex, FLOOR(avg(age)::integer) AS avg_age_of_death 
+                FROM (SELECT sex, age_at_death AS age from {0} WHERE dod IS NOT NULL AND {1} ='t' AND {2} ='t') as sq1 
+                GROUP BY sex;""", table_name, cleaned_disease1, cleaned_disease2)
         
         result = execute_query(cur, query)
         
-        avg_death_ages = {'Average_age_of_death':[]}
-        for row in result:
-            age = {'sex':row[0],'avg_age_of_death':row[1]}
-            avg_death_ages['Average_age_of_death'].append(age)
+        avg_death_ages = {'Average_age_of_death': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return avg_death_ages
     
+@lru_cache(maxsize=512)
 def high_and_low_carrier_reimb_state(race, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Get the states with the highest and lowest total carrier reimbursement 
@@ -375,52 +565,43 @@ def high_and_low_carrier_reimb_state(race, db_name='hs611db', user_name='ATW', p
     /api/v1/max_min_carrier_reimb/others
     """
     
-    races = ('white','black','hispanic','others')
-    
     # Strip the user input to alpha characters only
-    cleaned_race = re.sub('\W+', '', race)
+    cleaned_race = _NON_WORD.sub('', race)
+    if cleaned_race not in _RACES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_race))
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
+    con = None
     try:
-        if cleaned_race not in races:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_race))
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT state,race,total_carrier_reimb::float 
-                FROM( SELECT  LHS.state, LHS.race, SUM(RHS.carrier_reimb) AS total_carrier_reimb FROM
-                (SELECT * FROM {1}) AS RHS
-                LEFT JOIN
-                (SELECT * FROM {0}) AS LHS
-                ON LHS.id = RHS.id WHERE race = {2}
-                GROUP BY LHS.state,LHS.race) AS sq1
-                WHERE total_carrier_reimb = (SELECT MIN(total_carrier_reimb)::float 
-                FROM (SELECT SUM(LHS.carrier_reimb) AS total_carrier_reimb, RHS.state, RHS.race FROM
-                (SELECT * FROM {1}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {0}) AS RHS
-                ON LHS.id = RHS.id WHERE race = {2}
-                GROUP BY RHS.state, RHS.race) AS sq2
-                ) OR total_carrier_reimb = (SELECT MAX(total_carrier_reimb)::float 
-                FROM (SELECT SUM(LHS.carrier_reimb) AS total_carrier_reimb, RHS.state, RHS.race FROM
-                (SELECT * FROM {1}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {0}) AS RHS
-                ON LHS.id = RHS.id WHERE race = {2}
-                GROUP BY RHS.state, RHS.race) AS sq3)
-                ORDER by total_carrier_reimb ASC;""".format(table_name1,table_name2,"'"+cleaned_race+"'")
-        
-        result = execute_query(cur, query)
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""WITH totals AS
+                (SELECT state, race, SUM(carrier_reimb) AS total_carrier_reimb
+                FROM mv_cms WHERE race = %(race)s
+                GROUP BY state, race),
+                ranked AS
+                (SELECT state, race, total_carrier_reimb,
+                RANK() OVER (ORDER BY total_carrier_reimb ASC) AS low_rank,
+                RANK() OVER (ORDER BY total_carrier_reimb DESC) AS high_rank
+                FROM totals)
+                SELECT state, race, total_carrier_reimb::float AS carrier_reimb
+                FROM ranked
+                WHERE low_rank = 1 OR high_rank = 1
+                ORDER by carrier_reimb ASC;""")
+
+        result = execute_query(cur, query, {'race':cleaned_race})
         
-        total_carrier_reimb = {'Total_Carrier_Reimbursements':[]}
-        for row in result:
-            min_max = {'state':row[0], 'race':row[1],'carrier_reimb':row[2]}
-            total_carrier_reimb['Total_Carrier_Reimbursements'].append(min_max)
+        total_carrier_reimb = {'Total_Carrier_Reimbursements': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return total_carrier_reimb
 
 
+@lru_cache(maxsize=512)
 def max_total_cost_state_status(state, status, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Get the id of the person of a specified status (alive or dead) with the 
@@ -455,64 +636,52 @@ def max_total_cost_state_status(state, status, db_name='hs611db', user_name='ATW
     /api/v1/total_cost/MA/dead
     /api/v1/total_cost/OR/alive
     """
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
-    statuses = ('alive','dead')
-    
     # Strip the user input to alpha characters only
-    cleaned_status = re.sub('\W+', '', status)
+    cleaned_status = _NON_WORD.sub('', status)
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
+        cleaned_state = _NON_WORD.sub('', state)
         cleaned_state = cleaned_state.upper()
+    if cleaned_state not in _STATES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))
+    if cleaned_status not in _STATUSES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_status))
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))    
+    con = None
     try:
-        if cleaned_state not in states:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))
-        if cleaned_status not in statuses:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_status))
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))    
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT id, state,status, total_cost 
-                FROM (SELECT LHS.id, LHS.state,RHS.carrier_reimb+RHS.bene_resp AS total_cost, LHS.status 
-                FROM (SELECT id,state,status 
-                FROM (SELECT *,CASE 
-                WHEN dod IS NOT NULL THEN 'dead'
-                WHEN dod IS NULL THEN 'alive'
-                END AS status
-                FROM {0}) as sq1) AS LHS
-                LEFT JOIN
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id WHERE state = {2} AND status = '{3}') as sq2 
-                WHERE total_cost = (SELECT max(total_cost) 
-                FROM (SELECT LHS.id, LHS.state,RHS.carrier_reimb+RHS.bene_resp AS total_cost, LHS.status 
-                FROM (SELECT id,state,status 
-                FROM (SELECT *,CASE 
-                WHEN dod IS NOT NULL THEN 'dead'
-                WHEN dod IS NULL THEN 'alive'
-                END AS status
-                FROM {0}) as sq1) AS LHS
-                LEFT JOIN
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id WHERE state = {2} and status = '{3}') as sq2)  ;""".format(table_name1,table_name2,"'"+cleaned_state+"'",cleaned_status)
-        
-        result = execute_query(cur, query)
-        
-        max_total_cost = {'Max_Total_Cost':[]}
-        
-        for row in result:
-            cost = {'id':row[0], 'state':row[1], 'status':row[2],'total_cost':row[3]}
-            max_total_cost['Max_Total_Cost'].append(cost)
+        con, cur = cursor_connect(db_name, user_name, password)
+        # The status string is derived from dod, so filter on dod
+        # directly; the planner can then use the partial state indexes
+        # instead of computing CASE for every row before filtering.
+        if cleaned_status == 'dead':
+            dod_filter = 'dod IS NOT NULL'
+        else:
+            dod_filter = 'dod IS NULL'
+        query = _sql("""SELECT json_build_object('Max_Total_Cost',
+                COALESCE(json_agg(json_build_object('id', id, 'state', state, 'status', status, 'total_cost', total_cost)), '[]'::json)) AS result
+                FROM (WITH joined AS
+                (SELECT id, state, carrier_reimb+bene_resp AS total_cost
+                FROM mv_cms WHERE state = %(state)s AND __DOD_FILTER__)
+                SELECT id, state, %(status)s AS status, total_cost FROM
+                (SELECT id, state, total_cost, MAX(total_cost) OVER () AS max_cost FROM joined) AS ranked
+                WHERE total_cost = max_cost) AS final;""".replace('__DOD_FILTER__', dod_filter))
+
+        result = execute_query(cur, query, {'state':cleaned_state, 'status':cleaned_status})
+
+        max_total_cost = result[0]['result']
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return max_total_cost
     
     
+@lru_cache(maxsize=512)
 def hmo_mo_gt_average_for_state_disease(state, disease, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Returns the rows with hmo_mo values for those with a chosen disease greater 
@@ -546,52 +715,40 @@ def hmo_mo_gt_average_for_state_disease(state, disease, db_name='hs611db', user_
     /api/v1/gt_hmo_avg/CO/depression
     /api/v1/gt_hmo_avg/AK/cancer
     """
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
-    diseases = ('heart_fail','alz_rel_sen','depression','cancer')
     # Strip the user input to alpha characters only
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
+        cleaned_state = _NON_WORD.sub('', state)
         cleaned_state = cleaned_state.upper()
-    cleaned_disease = re.sub('\W+', '', disease)
+    cleaned_disease = _NON_WORD.sub('', disease)
+    if cleaned_state not in _STATES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))
+    if cleaned_disease not in _DISEASES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_disease))    
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
+    con = None
     try:
-        if cleaned_state not in states:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))
-        if cleaned_disease not in diseases:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_disease))    
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT id, state, {3},hmo_mo 
-                FROM (SELECT LHS.id,state,{3},hmo_mo  
-                FROM (SELECT * FROM {0}) AS LHS
-                LEFT JOIN                                     
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id WHERE state = {2} AND {3} = 't') as sq1
-                WHERE hmo_mo > (SELECT avg(hmo_mo) AS avg_hmo_mo 
-                FROM (SELECT LHS.id, state, cancer, hmo_mo  
-                FROM (SELECT * FROM {0}) AS LHS
-                LEFT JOIN                                     
-                (SELECT * from {1}) AS RHS
-                ON LHS.id = RHS.id WHERE state = {2} AND {3} = 't')as sq2);""".format(table_name1,table_name2,"'"+cleaned_state+"'",cleaned_disease)
-        
-        result = execute_query(cur, query)
-        
-        gt_average = {'Greater_Than_Average_HMO_MO':[]}
-        
-        for row in result:
-            gt_avg = {'id':row[0], 'state':row[1], cleaned_disease:row[2],'hmo_mo':row[3]}
-            gt_average['Greater_Than_Average_HMO_MO'].append(gt_avg)
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""SELECT id, state, {0}, hmo_mo FROM
+                (SELECT id, state, {0}, hmo_mo, AVG(hmo_mo) OVER () AS avg_hmo_mo
+                FROM mv_cms WHERE state = %(state)s AND {0} = 't') AS sq1
+                WHERE hmo_mo > avg_hmo_mo;""", cleaned_disease)
+
+        result = list(execute_query_iter(con, query, {'state':cleaned_state}))
+
+        gt_average = {'Greater_Than_Average_HMO_MO': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return gt_average  
     
+@lru_cache(maxsize=512)
 def state_avg_life_expectancies_by_sex(state, db_name='hs611db', user_name='ATW', password='', table_name='cmspop'): 
     """
     Returns the average life expectancies for each sex for a chosen state for 
@@ -625,10 +782,6 @@ def state_avg_life_expectancies_by_sex(state, db_name='hs611db', user_name='ATW'
     /api/v1/avg_life_expectancy/TX
     """
     
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
     
     
     # Strip the user input to alpha characters only
@@ -636,53 +789,36 @@ def state_avg_life_expectancies_by_sex(state, db_name='hs611db', user_name='ATW'
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
+        cleaned_state = _NON_WORD.sub('', state)
         cleaned_state = cleaned_state.upper()
+    if cleaned_state not in _STATES:
+        raise AssertionError("State '{0}' is not allowed".format(cleaned_state)) 
+    if table_name != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name))
+    con = None
     try:
-        if cleaned_state not in states:
-            raise AssertionError("State '{0}' is not allowed".format(cleaned_state)) 
-        if table_name != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-    
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT LHS4.state, LHS4.sex, avg_healthy_life_expectancy, avg_alzheimers_life_expectancy, avg_hf_life_expectancy, avg_depression_life_expectancy, avg_cancer_life_expectancy FROM 
-                (SELECT LHS3.state, LHS3.sex, avg_healthy_life_expectancy, avg_alzheimers_life_expectancy, avg_hf_life_expectancy, avg_depression_life_expectancy FROM 
-                (SELECT LHS2.state, LHS2.sex, avg_healthy_life_expectancy, avg_alzheimers_life_expectancy, avg_hf_life_expectancy FROM 
-                (SELECT LHS.state, LHS.sex, avg_healthy_life_expectancy, avg_alzheimers_life_expectancy FROM
-                (SELECT state, sex, FLOOR(avg(age))::integer as avg_healthy_life_expectancy 
-                FROM (SELECT state, sex, (dod-dob)/365 AS age from {0} WHERE dod IS NOT NULL AND alz_rel_sen = 'f' AND cancer = 'f' AND heart_fail = 'f' AND depression = 'f') AS sq1 
-                GROUP BY sex, state) AS LHS
-                LEFT JOIN
-                (SELECT state, sex, FLOOR(avg(age))::integer as avg_alzheimers_life_expectancy FROM (SELECT state, sex, (dod-dob)/365 AS age from {0} WHERE dod IS NOT NULL AND alz_rel_sen = 't' AND cancer = 'f' AND heart_fail = 'f' AND depression = 'f') AS sq2 
-                GROUP BY sex,state) AS RHS
-                ON LHS.state = RHS.state AND LHS.sex = RHS.sex) AS LHS2
-                LEFT JOIN 
-                (SELECT state, sex, FLOOR(avg(age))::integer as avg_hf_life_expectancy
-                FROM (SELECT state, sex, (dod-dob)/365 AS age from {0} WHERE dod IS NOT NULL AND heart_fail = 't' AND alz_rel_sen = 'f' AND cancer = 'f' AND depression = 'f') AS sq2 
-                GROUP BY sex,state) AS RHS2
-                ON LHS2.state = RHS2.state AND LHS2.sex = RHS2.sex) AS LHS3
-                LEFT JOIN
-                (SELECT state, sex, FLOOR(avg(age))::integer as avg_depression_life_expectancy
-                FROM (SELECT state, sex, (dod-dob)/365 AS age from {0} WHERE dod IS NOT NULL AND depression = 't' AND alz_rel_sen = 'f' AND cancer = 'f' AND heart_fail = 'f') AS sq2 
-                GROUP BY sex,state) AS RHS3
-                ON LHS3.state = RHS3.state AND LHS3.sex = RHS3.sex) AS LHS4
-                LEFT JOIN
-                (SELECT state, sex, FLOOR(avg(age))::integer as avg_cancer_life_expectancy
-                FROM (SELECT state, sex, (dod-dob)/365 AS age from {0} WHERE dod IS NOT NULL AND cancer= 't' AND alz_rel_sen = 'f' AND heart_fail = 'f' AND depression = 'f' ) AS sq2 
-                GROUP BY sex,state) AS RHS4
-                ON LHS4.state = RHS4.state AND LHS4.sex = RHS4.sex
-                WHERE LHS4.state = {1};""".format(table_name,"'"+cleaned_state+"'")
-        
-        result = execute_query(cur, query)
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""SELECT state, sex,
+                FLOOR(AVG(age) FILTER (WHERE alz_rel_sen = 'f' AND cancer = 'f' AND heart_fail = 'f' AND depression = 'f'))::integer AS "avg healthy life expectancy",
+                FLOOR(AVG(age) FILTER (WHERE alz_rel_sen = 't' AND cancer = 'f' AND heart_fail = 'f' AND depression = 'f'))::integer AS "avg alzheimers life expectancy",
+                FLOOR(AVG(age) FILTER (WHERE heart_fail = 't' AND alz_rel_sen = 'f' AND cancer = 'f' AND depression = 'f'))::integer AS "avg heart failure life expectancy",
+                FLOOR(AVG(age) FILTER (WHERE depression = 't' AND alz_rel_sen = 'f' AND cancer = 'f' AND heart_fail = 'f'))::integer AS "avg depression life expectancy",
+                FLOOR(AVG(age) FILTER (WHERE cancer = 't' AND alz_rel_sen = 'f' AND heart_fail = 'f' AND depression = 'f'))::integer AS "avg cancer life expectancy"
+                FROM (SELECT state, sex, alz_rel_sen, cancer, heart_fail, depression, age_at_death AS age
+                FROM {0} WHERE dod IS NOT NULL AND state = %(state)s) AS sq1
+                GROUP BY state, sex;""", table_name)
+
+        result = execute_query(cur, query, {'state':cleaned_state})
         
-        life_expectancies = {'Life_Expectancies':[]}
-        for row in result:
-            expect = {'state':row[0], 'sex':row[1], 'avg healthy life expectancy':row[2],'avg alzheimers life expectancy':row[3],'avg heart failure life expectancy':row[4],'avg depression life expectancy':row[5],'avg cancer life expectancy':row[6]}
-            life_expectancies['Life_Expectancies'].append(expect)
+        life_expectancies = {'Life_Expectancies': result}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return life_expectancies  
 
+@lru_cache(maxsize=512)
 def claims_deviations_by_state(state, db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'): 
     """
     Get the deviations from (the mean of) carrier_reimnb, bene_resp, and
@@ -715,57 +851,48 @@ def claims_deviations_by_state(state, db_name='hs611db', user_name='ATW', passwo
     /api/v1/deviations/MD
     /api/v1/deviations/NC
     """
-    states = ('AK', 'AL', 'AR', 'AZ', 'CA', 'CO', 'CT', 'DC', 'DE', 'FL', 'GA', 'HI', 'IA', 'ID', 'IL', 
-        'IN', 'KS', 'KY', 'LA', 'MA', 'MD', 'ME', 'MI', 'MN', 'MO', 'MS', 'MT', 'NC', 'ND', 'NE', 
-        'NH', 'NJ', 'NM', 'NV', 'NY', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 
-        'VA', 'VT', 'WA', 'WI', 'WV', 'WY', 'Othr')
     # Strip the user input to alpha characters only
     if state == 'Othr':
         cleaned_state = 'Othr'
     else:
-        cleaned_state = re.sub('\W+', '', state)
+        cleaned_state = _NON_WORD.sub('', state)
         cleaned_state = cleaned_state.upper()
+    if cleaned_state not in _STATES:
+        raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))   
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    
+    con = None
     try:
-        if cleaned_state not in states:
-            raise AssertionError("Race '{0}' is not allowed".format(cleaned_state))   
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        query = """SELECT id, state, ROUND(carrier_reimb-(SELECT AVG(carrier_reimb) as avg_carrier FROM (SELECT LHS.id,LHS.state,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * from {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq1 
-                WHERE state = {2})::numeric,2)::float AS carrier_deviation, ROUND(bene_resp-(SELECT AVG(bene_resp) as avg_bene FROM (SELECT LHS.id,LHS.state,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * from {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq2
-                WHERE state = {2})::numeric,2)::float AS bene_deviation, ROUND(hmo_mo-(SELECT AVG(hmo_mo) as avg_hmo FROM (SELECT LHS.id,LHS.state,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * from {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq3
-                WHERE state = {2})::numeric,2)::float AS hmo_deviation FROM (SELECT LHS.id,LHS.state,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * from {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq4
-                WHERE state = {2}
-                ORDER BY carrier_deviation;""".format(table_name1,table_name2,"'"+cleaned_state+"'")
-        
-        result = execute_query(cur, query)
-        
-        deviations = {'deviations':[]}
-        
-        for row in result:
-            patient = {'id':row[0], 'state':row[1], 'carrier_reimb deviation':row[2],'bene_resp deviation':row[3],'homo_mo deviation':row[4]}
-            deviations['deviations'].append(patient)
+        con, cur = cursor_connect(db_name, user_name, password)
+        query = _sql("""WITH joined AS
+                (SELECT id, state, carrier_reimb, bene_resp, hmo_mo
+                FROM mv_cms WHERE state = %(state)s),
+                devs AS
+                (SELECT id, state,
+                ROUND((carrier_reimb - AVG(carrier_reimb) OVER ())::numeric,2)::float AS carrier_dev,
+                ROUND((bene_resp - AVG(bene_resp) OVER ())::numeric,2)::float AS bene_dev,
+                ROUND((hmo_mo - AVG(hmo_mo) OVER ())::numeric,2)::float AS hmo_dev
+                FROM joined)
+                SELECT json_build_object('deviations', COALESCE(json_agg(
+                json_build_object('id', id, 'state', state,
+                'carrier_reimb deviation', carrier_dev,
+                'bene_resp deviation', bene_dev,
+                'homo_mo deviation', hmo_dev)
+                ORDER BY carrier_dev), '[]'::json)) AS result
+                FROM devs;""")
+
+        result = execute_query(cur, query, {'state':cleaned_state})
+
+        deviations = result[0]['result']
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return deviations
 
+@lru_cache(maxsize=512)
 def stat_select_for_sex(stat, sex,db_name='hs611db', user_name='ATW', password='', table_name1='cmspop', table_name2='cmsclaims'):
     """
     Calculates/returns the selected statistcal measure of age, carrier_reimnb, 
@@ -800,172 +927,104 @@ def stat_select_for_sex(stat, sex,db_name='hs611db', user_name='ATW', password='
     /api/v1/stats/median/male
     /api/v1/stats/sd/female
     """
-    stats = ('mean','median','sd')
-    sexes = ('male','female')
-    
     # Strip the user input to alpha characters only
-    cleaned_stat = re.sub('\W+', '', stat)
-    cleaned_sex = re.sub('\W+', '', sex)
-    try:
-        if cleaned_stat not in stats:
-            raise AssertionError("Statistic '{0}' is not allowed".format(cleaned_stat)) 
-        if cleaned_sex not in sexes:
-            raise AssertionError("Sex '{0}' is not allowed".format(cleaned_sex)) 
-        if table_name1 != 'cmspop':
-            raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
-        if table_name2 != 'cmsclaims':
-            raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
-            
-        con, cur = cursor_connect(db_name, user_name, password, cursor_factory=None)
-        
-        if stat == 'mean':
-            query = """ SELECT sex, FLOOR(avg(age)) AS age, ROUND(avg(carrier_reimb)::numeric,2)::float AS avg_carrier_resp, ROUND(avg(bene_resp)::numeric,2)::float AS avg_bene_resp, ROUND(avg(hmo_mo)::numeric,2)::float AS avg_hmo_mo 
-                    FROM (SELECT LHS.id,LHS.sex,LHS.state,FLOOR((LHS.dod-dob)/365) AS age, RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo 
-                    FROM
-                    (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE sex = {2}) AS tbl1
-                    GROUP by sex;""".format(table_name1,table_name2, "'"+cleaned_sex+"'")
-        if stat == 'median':
-                query = """SELECT sex, FLOOR(median_age)::float AS median_age,ROUND(median_carrier_reimb,2)::float AS median_carrier_reimb, ROUND(median_bene_resp,2)::float AS median_bene_resp,ROUND(median_hmo_mo,2)::float AS median_hmo_mo  
-                    FROM (
-                    (WITH med_age AS (SELECT age, row_number() OVER (ORDER BY age) AS row_id,
-                    (SELECT COUNT(1) FROM (SELECT *, (dod-dob)/365 AS age FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2}) AS ct
-                    FROM
-                    (SELECT *, (dod-dob)/365 AS AGE FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                        ON LHS.id=RHS.id WHERE  sex =  {2})
-                    SELECT AVG(age) AS median_age
-                    FROM med_age
-                    WHERE row_id BETWEEN ct/2.0 AND ct/2.0 + 1) AS t0
-                    
-                    CROSS JOIN
-                    
-                    (WITH med_carrier_reimb AS (SELECT carrier_reimb, row_number() OVER (ORDER BY carrier_reimb) AS row_id,
-                            (SELECT count(1) FROM (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2}) AS ct
-                    FROM 
-                    (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE sex =  {2})
-                    SELECT avg(carrier_reimb) AS median_carrier_reimb
-                    FROM med_carrier_reimb
-                    WHERE row_id BETWEEN ct/2.0 AND ct/2.0 + 1) AS t1
-                    
-                    CROSS JOIN
-                    
-                    (WITH med_bene_resp AS (SELECT bene_resp, row_number() OVER (ORDER BY bene_resp) AS row_id,
-                    (SELECT count(1) FROM (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2}) AS ct
-                    FROM 
-                    (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2})
-                    select avg(bene_resp) AS median_bene_resp
-                    FROM med_bene_resp
-                    WHERE row_id between ct/2.0 and ct/2.0 + 1) AS t2
-                    
-                    CROSS JOIN
-                    
-                    (WITH med_hmo_mo AS (SELECT sex, hmo_mo, row_number() OVER (ORDER BY hmo_mo) AS row_id,
-                    (SELECT count(1) FROM (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2}) AS ct
-                    FROM 
-                    (SELECT * FROM {0} WHERE dod IS NOT NULL) AS LHS
-                    LEFT JOIN
-                    (SELECT * FROM {1}) AS RHS
-                    ON LHS.id=RHS.id WHERE  sex =  {2})
-                    SELECT  sex, avg(hmo_mo) AS median_hmo_mo
-                    FROM med_hmo_mo
-                    WHERE row_id BETWEEN ct/2.0 AND ct/2.0 + 1
-                    GROUP BY sex) AS t3) AS meds;
-                    """.format(table_name1,table_name2,"'"+cleaned_sex+"'")
-        if stat == 'sd':
-            query = """SELECT * FROM
-                (SELECT sex, ROUND(SQRT(SUM(ROUND(age-(SELECT AVG(age) AS avg_age FROM (SELECT LHS.id,LHS.sex,LHS.age,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT *, (dod-dob)/365 AS age FROM {0} WHERE dod IS NOT NULL) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq1 
-                WHERE sex = {2})::numeric,2)::float^2)/COUNT(sex))::numeric,2)::float AS age_sd FROM 
-		(SELECT LHS.id,LHS.sex,LHS.age,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT *, (dod-dob)/365 AS age FROM {0} WHERE dod IS NOT NULL) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq4
-		WHERE sex = {2} GROUP BY sex) AS t0
-		
-                CROSS JOIN 
-                
-                (SELECT ROUND(SQRT(SUM(ROUND(carrier_reimb-(SELECT AVG(carrier_reimb) AS avg_carrier FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq1 
-                WHERE sex = {2})::numeric,2)::float^2)/COUNT(sex))::numeric,2)::float AS carrier_sd FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq4
-		WHERE sex = {2} GROUP BY sex) AS t1
-		
-                CROSS JOIN 
-                
-                (SELECT ROUND(SQRT(SUM(ROUND(bene_resp-(SELECT AVG(bene_resp) AS avg_bene FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq1 
-                WHERE sex = {2})::numeric,2)::float^2)/COUNT(sex))::numeric,2)::float AS bene_sd FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM {0}) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq4
-		 WHERE sex = {2} GROUP BY sex) AS t2
-		 
-                CROSS JOIN 
-                
-                (SELECT ROUND(SQRT(SUM(ROUND(bene_resp-(SELECT AVG(hmo_mo) AS avg_bene FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM cmspop) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq1 
-                WHERE sex = {2})::numeric,2)::float^2)/COUNT(sex))::numeric,2)::float AS hmo_mo_sd FROM (SELECT LHS.id,LHS.sex,RHS.carrier_reimb,RHS.bene_resp,RHS.hmo_mo FROM
-                (SELECT * FROM cmspop) AS LHS
-                LEFT JOIN
-                (SELECT * FROM {1}) AS RHS
-                ON LHS.id=RHS.id) AS sq4
-		 WHERE sex = {2} GROUP BY sex) AS t3;""".format(table_name1,table_name2,"'"+cleaned_sex+"'")
-        
-        result = execute_query(cur, query)
+    cleaned_stat = _NON_WORD.sub('', stat)
+    cleaned_sex = _NON_WORD.sub('', sex)
+    if cleaned_stat not in _STATS:
+        raise AssertionError("Statistic '{0}' is not allowed".format(cleaned_stat)) 
+    if cleaned_sex not in _SEXES:
+        raise AssertionError("Sex '{0}' is not allowed".format(cleaned_sex)) 
+    if table_name1 != 'cmspop':
+        raise AssertionError("Table '{0}' is not allowed please use cmspop".format(table_name1))
+    if table_name2 != 'cmsclaims':
+        raise AssertionError("Table '{0}' is not allowed please use cmsclaims".format(table_name2))
         
-        stat_dict = {'statistic':[]}
+    con = None
+    try:
+        con, cur = cursor_connect(db_name, user_name, password)
         
-        if stat == 'mean':
-            for row in result:
-                statistic = {'sex':row[0], 'age':row[1], 'mean_carrier_reimb':row[2],'mean_bene_resp':row[3],'mean_homo_mo devations':row[4]}
-                stat_dict['statistic'].append(statistic)
-        if stat == 'median':
-            for row in result:
-                statistic = {'sex':row[0], 'age':row[1], 'median_carrier_reimb':row[2],'median_bene_resp':row[3],'median_homo_mo devations':row[4]}
-                stat_dict['statistic'].append(statistic)
-        if stat == 'sd':
-            for row in result:
-                statistic = {'sex':row[0], 'age':row[1], 'carrier_reimb_sd':row[2],'bene_resp_sd':row[3],'homo_mo_sd':row[4]}
-                stat_dict['statistic'].append(statistic)        
+        _prepare_once(con, cur, 'stats_by_sex', _STATS_BY_SEX_STATEMENT)
+        result = execute_query(cur, 'EXECUTE stats_by_sex(%s);', (cleaned_sex,))
+
+        rows = []
+        for row in result:
+            projected = {'sex': row['sex']}
+            for out_key, src_key in _STAT_FIELDS[cleaned_stat]:
+                projected[out_key] = row[src_key]
+            rows.append(projected)
+        stat_dict = {'statistic': rows}
     except Exception as e:
-        raise Exception("Error: {}".format(e.message))
+        raise RuntimeError("Error: {0}".format(e)) from e
+    finally:
+        if con is not None:
+            release_connection(con)
     return stat_dict
+
+
+
+def run_dashboard(disease, state, race, db_name='hs611db', user_name='ATW', password=''):
+    """
+    Runs the queries behind a typical dashboard render concurrently.
+
+    psycopg2 has no pipeline mode, so instead of firing the statements
+    back-to-back on one socket each endpoint runs on its own pooled
+    connection in a worker thread; the wall time is that of the slowest
+    query rather than the sum, and lru_cache hits short-circuit workers
+    entirely.
+
+    Parameters
+    ----------
+    disease : str
+        Disease of interest for the count and ratio panels
+    state : str
+        State abbreviation for the ratio and averages panels
+    race : str
+        race for the high/low carrier reimbursement panel
+    db_name: str
+        name of database being accessed
+    user_name: str
+        username used to access the specfied database
+    password: str
+        password corresponding to user_name
+
+    Returns
+    -------
+    dict
+        The four endpoints' responses keyed by panel name.
+    """
+    calls = (
+        ('disease_counts', disease_count_by_race,
+         (disease, db_name, user_name, password)),
+        ('max_ratio', disease_max_carrier_bene_ratio_by_state_sex,
+         (disease, state, db_name, user_name, password)),
+        ('carrier_reimb_avgs', carrier_reimb_avgs_select_state,
+         (state, db_name, user_name, password)),
+        ('high_low_carrier_reimb', high_and_low_carrier_reimb_state,
+         (race, db_name, user_name, password)),
+    )
+    with ThreadPoolExecutor(max_workers=len(calls)) as executor:
+        futures = [(key, executor.submit(func, *args))
+                   for key, func, args in calls]
+        return dict((key, future.result()) for key, future in futures)
+
+
+def clear_result_caches():
+    """
+    Drops every endpoint's cached results.
+
+    The query inputs are low-cardinality and the CMS tables change
+    rarely, so responses are memoized with lru_cache; call this after
+    the underlying tables are reloaded so stale results are not served.
+    Cached dicts are shared between callers and must not be mutated.
+    """
+    for func in (disease_count_by_race,
+                 disease_max_carrier_bene_ratio_by_state_sex,
+                 carrier_reimb_avgs_select_state,
+                 avg_death_age_for_concurrent_disease_by_sex,
+                 high_and_low_carrier_reimb_state,
+                 max_total_cost_state_status,
+                 hmo_mo_gt_average_for_state_disease,
+                 state_avg_life_expectancies_by_sex,
+                 claims_deviations_by_state,
+                 stat_select_for_sex):
+        func.cache_clear()
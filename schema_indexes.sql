@@ -0,0 +1,48 @@
+-- Supporting indexes for the hot filter columns used by final_assignment.py.
+-- Every endpoint filters cmspop by state, race, or one of the disease
+-- boolean flags and joins cmsclaims on id; without these the queries run
+-- as sequential scans. Run once against the hs611db database:
+--     psql hs611db -f schema_indexes.sql
+
+CREATE INDEX cmspop_state_idx ON cmspop (state);
+
+-- Partial indexes, one per whitelisted disease, matching the
+-- "WHERE <disease> = 't' AND state = ..." filter pattern.
+CREATE INDEX cmspop_state_heart_fail_idx ON cmspop (state) WHERE heart_fail = 't';
+CREATE INDEX cmspop_state_alz_rel_sen_idx ON cmspop (state) WHERE alz_rel_sen = 't';
+CREATE INDEX cmspop_state_depression_idx ON cmspop (state) WHERE depression = 't';
+CREATE INDEX cmspop_state_cancer_idx ON cmspop (state) WHERE cancer = 't';
+
+-- Composite index for high_and_low_carrier_reimb_state, which filters by
+-- race and groups by (state, race).
+CREATE INDEX cmspop_race_state_idx ON cmspop (race, state);
+
+-- Join key for the cmspop LEFT JOIN cmsclaims queries.
+CREATE INDEX cmsclaims_id_idx ON cmsclaims (id);
+
+-- Death-date partial indexes, one per disease, so the concurrent-disease
+-- age-of-death query can combine two of them with a BitmapAnd instead of
+-- sequentially scanning cmspop.
+CREATE INDEX cmspop_dod_heart_fail_idx ON cmspop (dod) WHERE heart_fail = 't';
+CREATE INDEX cmspop_dod_alz_rel_sen_idx ON cmspop (dod) WHERE alz_rel_sen = 't';
+CREATE INDEX cmspop_dod_depression_idx ON cmspop (dod) WHERE depression = 't';
+CREATE INDEX cmspop_dod_cancer_idx ON cmspop (dod) WHERE cancer = 't';
+
+-- Precomputed age at death so the age queries stop doing per-row date
+-- arithmetic at query time. age() counts whole calendar years, so leap
+-- years do not skew the result the way (dod - dob) / 365 did.
+ALTER TABLE cmspop ADD COLUMN age_at_death integer
+    GENERATED ALWAYS AS (EXTRACT(YEAR FROM age(dod::timestamp, dob::timestamp))::integer) STORED;
+
+-- Alive/dead partial indexes for max_total_cost_state_status, which now
+-- filters on dod IS [NOT] NULL directly instead of a derived CASE column.
+CREATE INDEX cmspop_state_alive_idx ON cmspop (state) WHERE dod IS NULL;
+CREATE INDEX cmspop_state_dead_idx ON cmspop (state) WHERE dod IS NOT NULL;
+
+-- Death-cohort index for the by-sex statistics endpoints, which always
+-- filter "dod IS NOT NULL AND sex = ...".
+CREATE INDEX cmspop_sex_dead_idx ON cmspop (sex) WHERE dod IS NOT NULL;
+
+-- Refresh planner statistics once the indexes and generated column exist.
+VACUUM ANALYZE cmspop;
+VACUUM ANALYZE cmsclaims;
@@ -0,0 +1,34 @@
+-- Prejoined cmspop/cmsclaims materialized view backing the endpoints in
+-- final_assignment.py that used to repeat the same join per request.
+-- The join is INNER: every consumer of the view aggregates or ranks the
+-- claims columns, so beneficiaries without a claims row would only
+-- contribute null-extended rows that the aggregates skip anyway.
+-- Build once, then refresh after each data load (the unique index on id
+-- allows REFRESH ... CONCURRENTLY):
+--     psql hs611db -f schema_matview.sql
+--     REFRESH MATERIALIZED VIEW CONCURRENTLY mv_cms;
+
+CREATE MATERIALIZED VIEW mv_cms AS
+SELECT p.id,
+       p.sex,
+       p.state,
+       p.race,
+       p.dob,
+       p.dod,
+       p.age_at_death AS age,
+       p.heart_fail,
+       p.alz_rel_sen,
+       p.depression,
+       p.cancer,
+       c.carrier_reimb,
+       c.bene_resp,
+       c.hmo_mo,
+       (c.carrier_reimb::float / NULLIF(c.bene_resp, 0)) AS carrier_bene_ratio
+FROM cmspop p
+JOIN cmsclaims c ON p.id = c.id;
+
+CREATE UNIQUE INDEX mv_cms_id_idx ON mv_cms (id);
+CREATE INDEX mv_cms_state_idx ON mv_cms (state);
+CREATE INDEX mv_cms_sex_idx ON mv_cms (sex);
+CREATE INDEX mv_cms_race_idx ON mv_cms (race);
+CREATE INDEX mv_cms_age_idx ON mv_cms (age) WHERE age IS NOT NULL;